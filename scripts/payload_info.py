@@ -22,9 +22,34 @@ from __future__ import absolute_import
 from __future__ import print_function
 
 import argparse
+import binascii
+import importlib.util
+import itertools
+import operator
+import os
 import sys
-import textwrap
 
+
+def _UseNativeProtobuf():
+  """Selects the C++ protobuf backend when it is installed.
+
+  The pure Python backend is much slower at walking large manifests. This has
+  to run before the first protobuf import, and an explicit
+  PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION in the environment always wins.
+  Newer protobuf releases default to the native upb backend on their own.
+  """
+  if 'PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION' in os.environ:
+    return
+  try:
+    if importlib.util.find_spec('google.protobuf.pyext._message'):
+      os.environ['PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION'] = 'cpp'
+  except ImportError:
+    pass
+
+
+_UseNativeProtobuf()
+
+# pylint: disable=wrong-import-position
 from six.moves import range
 import update_metadata_pb2
 import update_payload
@@ -32,6 +57,8 @@ import update_payload
 
 MAJOR_PAYLOAD_VERSION_BRILLO = 2
 
+_NUM_BLOCKS = operator.attrgetter('num_blocks')
+
 def DisplayValue(key, value):
   """Print out a key, value pair with values left-aligned."""
   if value is not None:
@@ -40,15 +67,23 @@ def DisplayValue(key, value):
     raise ValueError('Cannot display an empty value.')
 
 
+# Translation table mapping non-printable bytes to '.', so the translated data
+# is always plain ASCII.
+_PRINTABLE = bytes(c if 32 <= c < 127 else ord('.') for c in range(256))
+
+
 def DisplayHexData(data, indent=0):
   """Print out binary data as a hex values."""
-  for off in range(0, len(data), 16):
-    chunk = bytearray(data[off:off + 16])
-    print(' ' * indent +
-          ' '.join('%.2x' % c for c in chunk) +
-          '   ' * (16 - len(chunk)) +
-          ' | ' +
-          ''.join(chr(c) if 32 <= c < 127 else '.' for c in chunk))
+  # Convert the whole blob at once and slice the rows out of it; each byte
+  # takes three characters of |hex_str| and one of |ascii_str|.
+  hex_str = binascii.hexlify(data, ' ').decode('ascii')
+  ascii_str = data.translate(_PRINTABLE).decode('ascii')
+  prefix = ' ' * indent
+  lines = [prefix + hex_str[3 * off:3 * off + 47].ljust(47) + ' | ' +
+           ascii_str[off:off + 16]
+           for off in range(0, len(data), 16)]
+  if lines:
+    sys.stdout.write('\n'.join(lines) + '\n')
 
 
 class PayloadCommand:
@@ -73,15 +108,20 @@ class PayloadCommand:
     manifest = self.payload.manifest
     # pylint: disable=no-member
     DisplayValue('Number of partitions', len(manifest.partitions))
+    # Walk the partitions once, but keep the output grouped by field.
+    op_counts = []
+    timestamps = []
+    cow_sizes = []
     for partition in manifest.partitions:
-      DisplayValue('  Number of "%s" ops' % partition.partition_name,
-                   len(partition.operations))
-    for partition in manifest.partitions:
-      DisplayValue("  Timestamp for " +
-                   partition.partition_name, partition.version)
-    for partition in manifest.partitions:
-      DisplayValue("  COW Size for " +
-                   partition.partition_name, partition.estimate_cow_size)
+      partition_name = partition.partition_name
+      op_counts.append(('  Number of "%s" ops' % partition_name,
+                        len(partition.operations)))
+      timestamps.append(("  Timestamp for " + partition_name,
+                         partition.version))
+      cow_sizes.append(("  COW Size for " + partition_name,
+                        partition.estimate_cow_size))
+    for key, value in op_counts + timestamps + cow_sizes:
+      DisplayValue(key, value)
     DisplayValue('Block size', manifest.block_size)
     DisplayValue('Minor version', manifest.minor_version)
 
@@ -93,11 +133,9 @@ class PayloadCommand:
       DisplayValue('Metadata signatures blob',
                    'file_offset=%d (%d bytes)' %
                    (offset, header.metadata_signature_len))
-      # pylint: disable=invalid-unary-operand-type
-      signatures_blob = self.payload.ReadDataBlob(
-          -header.metadata_signature_len,
-          header.metadata_signature_len)
-      self._DisplaySignaturesBlob('Metadata', signatures_blob)
+      # Payload.Init() always parses a non-empty metadata signatures blob.
+      self._DisplaySignaturesMessage('Metadata',
+                                     self.payload.metadata_signature)
     else:
       print('No metadata signatures stored in the payload')
 
@@ -108,17 +146,28 @@ class PayloadCommand:
       if manifest.signatures_size:
         signature_msg += ' (%d bytes)' % manifest.signatures_size
       DisplayValue('Payload signatures blob', signature_msg)
-      signatures_blob = self.payload.ReadDataBlob(manifest.signatures_offset,
-                                                  manifest.signatures_size)
-      self._DisplaySignaturesBlob('Payload', signatures_blob)
+      # Payload.Init() skips payload signatures at offset 0 or past the end of
+      # the file; read them here so they are still shown, or a bad offset is
+      # reported.
+      signatures = self.payload.payload_signature
+      if signatures is None:
+        signatures = self._ParseSignatures(self.payload.ReadDataBlob(
+            manifest.signatures_offset, manifest.signatures_size))
+      self._DisplaySignaturesMessage('Payload', signatures)
     else:
       print('No payload signatures stored in the payload')
 
   @staticmethod
-  def _DisplaySignaturesBlob(signature_name, signatures_blob):
-    """Show information about the signatures blob."""
+  def _ParseSignatures(signatures_blob):
+    """Returns the Signatures message parsed from the signatures blob."""
     signatures = update_metadata_pb2.Signatures()
-    signatures.ParseFromString(signatures_blob)
+    # The message is fresh, so there is nothing for ParseFromString to clear.
+    signatures.MergeFromString(signatures_blob)
+    return signatures
+
+  @staticmethod
+  def _DisplaySignaturesMessage(signature_name, signatures):
+    """Show information about a Signatures message."""
     # pylint: disable=no-member
     print('%s signatures: (%d entries)' %
           (signature_name, len(signatures.signatures)))
@@ -140,31 +189,74 @@ class PayloadCommand:
       operations: The operations object that you want to display information
                   about.
     """
-    def _DisplayExtents(extents, name):
-      """Show information about extents."""
-      num_blocks = sum([ext.num_blocks for ext in extents])
-      ext_str = ' '.join(
-          '(%s,%s)' % (ext.start_block, ext.num_blocks) for ext in extents)
-      # Make extent list wrap around at 80 chars.
-      ext_str = '\n      '.join(textwrap.wrap(ext_str, 74))
+    def _DisplayExtents(extents, name, out):
+      """Add information about extents to the |out| lines."""
+      num_blocks = sum(map(_NUM_BLOCKS, extents))
+      # Make extent list wrap around at 80 chars. The tokens never contain
+      # spaces, so a greedy fill is all textwrap would do here.
+      lines = []
+      line = []
+      line_len = -1
+      for tok in [f'({ext.start_block},{ext.num_blocks})' for ext in extents]:
+        if line and line_len + 1 + len(tok) > 74:
+          lines.append(' '.join(line))
+          line = []
+          line_len = -1
+        line.append(tok)
+        line_len += 1 + len(tok)
+      lines.append(' '.join(line))
+      ext_str = '\n      '.join(lines)
       extent_plural = 's' if len(extents) > 1 else ''
       block_plural = 's' if num_blocks > 1 else ''
-      print('    %s: %d extent%s (%d block%s)' %
-            (name, len(extents), extent_plural, num_blocks, block_plural))
-      print('      %s' % ext_str)
+      out.append('    %s: %d extent%s (%d block%s)' %
+                 (name, len(extents), extent_plural, num_blocks, block_plural))
+      out.append('      %s' % ext_str)
 
     op_dict = update_payload.common.OpType.NAMES
-    print('%s:' % name)
+    # Collect the whole table and write it out at once; this can be megabytes
+    # of text for large payloads.
+    out = ['%s:' % name]
+    append = out.append
     for op_count, op in enumerate(operations):
-      print('  %d: %s' % (op_count, op_dict[op.type]))
-      if op.HasField('data_offset'):
-        print('    Data offset: %s' % op.data_offset)
-      if op.HasField('data_length'):
-        print('    Data length: %s' % op.data_length)
-      if op.src_extents:
-        _DisplayExtents(op.src_extents, 'Source')
-      if op.dst_extents:
-        _DisplayExtents(op.dst_extents, 'Destination')
+      has_field = op.HasField
+      src_extents = op.src_extents
+      dst_extents = op.dst_extents
+      append('  %d: %s' % (op_count, op_dict[op.type]))
+      # A zero offset or length is valid, so presence has to be checked.
+      if has_field('data_offset'):
+        append('    Data offset: ' + str(op.data_offset))
+      if has_field('data_length'):
+        append('    Data length: ' + str(op.data_length))
+      if src_extents:
+        _DisplayExtents(src_extents, 'Source', out)
+      if dst_extents:
+        _DisplayExtents(dst_extents, 'Destination', out)
+    sys.stdout.write('\n'.join(out) + '\n')
+
+  @staticmethod
+  def _GetOperationStats(operations):
+    """Returns the (read, written, write seeks) block stats of |operations|.
+
+    Partitions are independent of each other, so seeks are only counted
+    between the destination extents of a single partition's operations.
+    """
+    # Source extents are only summed, so they are chained without copying.
+    # The destination extent fields are pulled out once as parallel lists,
+    # since the seek count walks them in step.
+    src_extents = itertools.chain.from_iterable(
+        op.src_extents for op in operations)
+    dst_extents = [ext for op in operations for ext in op.dst_extents]
+    dst_start_blocks = [ext.start_block for ext in dst_extents]
+    dst_num_blocks = [ext.num_blocks for ext in dst_extents]
+
+    # Count the extents that aren't contiguous with the previous one.
+    num_write_seeks = sum(
+        1 for start, last_start, last_num in zip(dst_start_blocks[1:],
+                                                 dst_start_blocks,
+                                                 dst_num_blocks)
+        if start != last_start + last_num)
+    return (sum(map(_NUM_BLOCKS, src_extents)), sum(dst_num_blocks),
+            num_write_seeks)
 
   def _GetStats(self, manifest):
     """Returns various statistics about a payload file.
@@ -176,21 +268,19 @@ class PayloadCommand:
     read_blocks = 0
     written_blocks = 0
     num_write_seeks = 0
+    block_size = manifest.block_size
     for partition in manifest.partitions:
-      last_ext = None
-      for curr_op in partition.operations:
-        read_blocks += sum([ext.num_blocks for ext in curr_op.src_extents])
-        written_blocks += sum([ext.num_blocks for ext in curr_op.dst_extents])
-        for curr_ext in curr_op.dst_extents:
-          # See if the extent is contiguous with the last extent seen.
-          if last_ext and (curr_ext.start_block !=
-                           last_ext.start_block + last_ext.num_blocks):
-            num_write_seeks += 1
-          last_ext = curr_ext
+      op_read, op_written, op_seeks = self._GetOperationStats(
+          partition.operations)
+      read_blocks += op_read
+      written_blocks += op_written
+      num_write_seeks += op_seeks
 
       # Old and new partitions are read once during verification.
-      read_blocks += partition.old_partition_info.size // manifest.block_size
-      read_blocks += partition.new_partition_info.size // manifest.block_size
+      # Sizes needn't be block aligned, so each is rounded down separately.
+      old_size = partition.old_partition_info.size
+      new_size = partition.new_partition_info.size
+      read_blocks += old_size // block_size + new_size // block_size
 
     stats = {'read_blocks': read_blocks,
              'written_blocks': written_blocks,
@@ -203,9 +293,17 @@ class PayloadCommand:
     DisplayValue('Blocks written', stats['written_blocks'])
     DisplayValue('Seeks when writing', stats['num_write_seeks'])
 
+  def OpenPayload(self):
+    """Open the update payload, unless that was already done."""
+    if self.payload is None:
+      payload_file = self.options.payload_file
+      if payload_file == '-':
+        payload_file = sys.stdin.buffer
+      self.payload = update_payload.Payload(payload_file)
+
   def Run(self):
     """Parse the update payload and display information from it."""
-    self.payload = update_payload.Payload(self.options.payload_file)
+    self.OpenPayload()
     self.payload.Init()
     self._DisplayHeader()
     self._DisplayManifest()
@@ -224,8 +322,8 @@ class PayloadCommand:
 def main():
   parser = argparse.ArgumentParser(
       description='Show information about an update payload.')
-  parser.add_argument('payload_file', type=argparse.FileType('rb'),
-                      help='The update payload file.')
+  parser.add_argument('payload_file', type=str,
+                      help='The update payload file, or - for stdin.')
   parser.add_argument('--list_ops', default=False, action='store_true',
                       help='List the install operations and their extents.')
   parser.add_argument('--stats', default=False, action='store_true',
@@ -234,7 +332,19 @@ def main():
                       help='Show signatures stored in the payload.')
   args = parser.parse_args()
 
-  PayloadCommand(args).Run()
+  # The payload is opened by update_payload.Payload rather than argparse, so
+  # report files that can't be opened the same way argparse would.
+  payload_cmd = PayloadCommand(args)
+  try:
+    payload_cmd.OpenPayload()
+  except OSError as e:
+    parser.error("argument payload_file: can't open '%s': %s" %
+                 (args.payload_file, e))
+
+  # Don't flush on every newline when writing to a terminal.
+  sys.stdout.reconfigure(line_buffering=False)
+
+  payload_cmd.Run()
 
 
 if __name__ == '__main__':
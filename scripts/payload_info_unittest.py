@@ -23,7 +23,11 @@
 from __future__ import absolute_import
 from __future__ import print_function
 
+import os
+import shutil
+import struct
 import sys
+import tempfile
 import unittest
 
 from contextlib import contextmanager
@@ -90,6 +94,8 @@ class FakePartition(object):
     self.operations = operations
     self.old_partition_info = FakePartitionInfo(old_size)
     self.new_partition_info = FakePartitionInfo(new_size)
+    self.version = '1.0'
+    self.estimate_cow_size = new_size
 
 
 class FakeManifest(object):
@@ -146,6 +152,8 @@ class FakePayload(object):
     self._blobs = {}
     self._payload_signatures = update_metadata_pb2.Signatures()
     self._metadata_signatures = update_metadata_pb2.Signatures()
+    self.payload_signature = None
+    self.metadata_signature = None
 
   def Init(self):
     """Fake Init that sets header and manifest.
@@ -179,14 +187,13 @@ class FakePayload(object):
     self._manifest.signatures_offset = 1234
     self._manifest.signatures_size = len(blob)
     self._blobs[self._manifest.signatures_offset] = blob
+    self.payload_signature = self._payload_signatures
 
   def AddMetadataSignature(self, **kwargs):
     self._AddSignatureToProto(self._metadata_signatures, **kwargs)
-    if self._header.metadata_signature_len:
-      del self._blobs[-self._header.metadata_signature_len]
-    blob = self._metadata_signatures.SerializeToString()
-    self._header.metadata_signature_len = len(blob)
-    self._blobs[-len(blob)] = blob
+    self._header.metadata_signature_len = len(
+        self._metadata_signatures.SerializeToString())
+    self.metadata_signature = self._metadata_signatures
 
 
 class PayloadCommandTest(unittest.TestCase):
@@ -228,6 +235,10 @@ Manifest length:             222
 Number of partitions:        2
   Number of "root" ops:      1
   Number of "kernel" ops:    1
+  Timestamp for root:        1.0
+  Timestamp for kernel:      1.0
+  COW Size for root:         12288
+  COW Size for kernel:       16384
 Block size:                  4096
 Minor version:               4
 """
@@ -243,6 +254,10 @@ Manifest length:             222
 Number of partitions:        2
   Number of "root" ops:      1
   Number of "kernel" ops:    1
+  Timestamp for root:        1.0
+  Timestamp for kernel:      1.0
+  COW Size for root:         12288
+  COW Size for kernel:       16384
 Block size:                  4096
 Minor version:               4
 
@@ -272,6 +287,10 @@ Manifest length:             222
 Number of partitions:        2
   Number of "root" ops:      1
   Number of "kernel" ops:    1
+  Timestamp for root:        1.0
+  Timestamp for kernel:      1.0
+  COW Size for root:         12288
+  COW Size for kernel:       16384
 Block size:                  4096
 Minor version:               4
 Blocks read:                 11
@@ -290,6 +309,10 @@ Manifest length:             222
 Number of partitions:        2
   Number of "root" ops:      1
   Number of "kernel" ops:    1
+  Timestamp for root:        1.0
+  Timestamp for kernel:      1.0
+  COW Size for root:         12288
+  COW Size for kernel:       16384
 Block size:                  4096
 Minor version:               4
 No metadata signatures stored in the payload
@@ -311,6 +334,10 @@ Manifest length:             222
 Number of partitions:        2
   Number of "root" ops:      1
   Number of "kernel" ops:    1
+  Timestamp for root:        1.0
+  Timestamp for kernel:      1.0
+  COW Size for root:         12288
+  COW Size for kernel:       16384
 Block size:                  4096
 Minor version:               4
 Metadata signatures blob:    file_offset=246 (7 bytes)
@@ -329,6 +356,100 @@ Payload signatures: (2 entries)
 """
     self.TestCommand(payload_cmd, payload, expected_out)
 
+  def testSignaturesFromBlob(self):
+    """Verify that payload signatures not parsed by Init() are read."""
+    payload_cmd = payload_info.PayloadCommand(
+        FakeOption(action='show', signatures=True))
+    payload = FakePayload()
+    payload.AddPayloadSignature(version=1,
+                                data=b'12345678abcdefgh\x00\x01\x02\x03')
+    payload.payload_signature = None
+    expected_out = """Payload version:             2
+Manifest length:             222
+Number of partitions:        2
+  Number of "root" ops:      1
+  Number of "kernel" ops:    1
+  Timestamp for root:        1.0
+  Timestamp for kernel:      1.0
+  COW Size for root:         12288
+  COW Size for kernel:       16384
+Block size:                  4096
+Minor version:               4
+No metadata signatures stored in the payload
+Payload signatures blob:     blob_offset=1234 (26 bytes)
+Payload signatures: (1 entries)
+  version=1, hex_data: (20 bytes)
+    31 32 33 34 35 36 37 38 61 62 63 64 65 66 67 68 | 12345678abcdefgh
+    00 01 02 03                                     | ....
+"""
+    self.TestCommand(payload_cmd, payload, expected_out)
+
+
+class PayloadCommandFileTest(unittest.TestCase):
+  """Test PayloadCommand against payload files read by the real Payload."""
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.payload_path = os.path.join(self.tmpdir, 'payload.bin')
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def _WritePayload(self, signatures_offset, signatures_blob):
+    """Write a payload without partitions whose data is |signatures_blob|."""
+    manifest = update_metadata_pb2.DeltaArchiveManifest()
+    manifest.block_size = 4096
+    manifest.minor_version = 4
+    manifest.signatures_offset = signatures_offset
+    manifest.signatures_size = len(signatures_blob)
+    manifest_blob = manifest.SerializeToString()
+    with open(self.payload_path, 'wb') as f:
+      f.write(b'CrAU' + struct.pack('>QQI',
+                                    payload_info.MAJOR_PAYLOAD_VERSION_BRILLO,
+                                    len(manifest_blob), 0))
+      f.write(manifest_blob)
+      f.write(signatures_blob)
+
+  def _RunSignatures(self):
+    """Run --signatures on the payload file and return the output."""
+    payload_cmd = payload_info.PayloadCommand(
+        FakeOption(action='show', signatures=True,
+                   payload_file=self.payload_path))
+    stdout = sys.stdout
+    try:
+      sys.stdout = StringIO()
+      payload_cmd.Run()
+      return sys.stdout.getvalue()
+    finally:
+      sys.stdout = stdout
+
+  def testSignaturesAtDataStart(self):
+    """Verify payload signatures that Payload.Init() skips are still shown."""
+    # Payload.Init() doesn't parse signatures at offset 0, so they are read
+    # from the blob by payload_info.
+    signatures = update_metadata_pb2.Signatures()
+    signatures.signatures.add(version=1, data=b'signature data')
+    self._WritePayload(0, signatures.SerializeToString())
+    expected_out = """Payload version:             2
+Manifest length:             9
+Number of partitions:        0
+Block size:                  4096
+Minor version:               4
+No metadata signatures stored in the payload
+Payload signatures blob:     blob_offset=0 (20 bytes)
+Payload signatures: (1 entries)
+  version=1, hex_data: (14 bytes)
+    73 69 67 6e 61 74 75 72 65 20 64 61 74 61       | signature data
+"""
+    self.assertEqual(self._RunSignatures(), expected_out)
+
+  def testSignaturesPastEnd(self):
+    """Verify signatures past the end of the file raise a PayloadError."""
+    self._WritePayload(10**6, b'signature blob')
+    with self.assertRaisesRegex(update_payload.PayloadError,
+                                self.payload_path):
+      self._RunSignatures()
+
 
 if __name__ == '__main__':
   unittest.main()
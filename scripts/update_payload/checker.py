@@ -1144,7 +1144,8 @@ class PayloadChecker(object):
     # them in order (which currently holds). This should be reconsidered.
     payload_hasher = self.payload.manifest_hasher.copy()
     common.Read(self.payload.payload_file, self.sigs_offset,
-                offset=self.payload.data_offset, hasher=payload_hasher)
+                offset=self.payload.data_offset, hasher=payload_hasher,
+                name=self.payload.name)
 
     for sig, sig_name in common.SignatureIter(sigs.signatures, 'signatures'):
       sig_report = report.AddSubReport(sig_name)
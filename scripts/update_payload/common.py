@@ -119,7 +119,7 @@ def IntPackingFmtStr(size, is_unsigned):
   return fmt
 
 
-def Read(file_obj, length, offset=None, hasher=None):
+def Read(file_obj, length, offset=None, hasher=None, name=None):
   """Reads binary data from a file.
 
   Args:
@@ -129,6 +129,8 @@ def Read(file_obj, length, offset=None, hasher=None):
             from either the beginning (non-negative) or end (negative) of the
             file.  (optional)
     hasher: a hashing object to pass the read data through (optional)
+    name: the file name used in error messages; needed for objects without a
+          name attribute such as mmaps (optional, defaults to file_obj.name)
 
   Returns:
     A string containing the read data.
@@ -136,21 +138,29 @@ def Read(file_obj, length, offset=None, hasher=None):
   Raises:
     PayloadError if a read error occurred or not enough data was read.
   """
+  data = None
   if offset is not None:
-    if offset >= 0:
-      file_obj.seek(offset)
-    else:
-      file_obj.seek(offset, 2)
-
-  try:
-    data = file_obj.read(length)
-  except IOError as e:
-    raise PayloadError('error reading from file (%s): %s' % (file_obj.name, e))
+    try:
+      if offset >= 0:
+        file_obj.seek(offset)
+      else:
+        file_obj.seek(offset, 2)
+    except ValueError:
+      # Memory-mapped files refuse to seek past their end, where a regular
+      # file would just read short; report it the same way.
+      data = b''
+
+  if data is None:
+    try:
+      data = file_obj.read(length)
+    except IOError as e:
+      raise PayloadError('error reading from file (%s): %s' %
+                         (name or file_obj.name, e))
 
   if len(data) != length:
     raise PayloadError(
         'reading from file (%s) too short (%d instead of %d bytes)' %
-        (file_obj.name, len(data), length))
+        (name or file_obj.name, len(data), length))
 
   if hasher:
     hasher.update(data)
@@ -23,6 +23,7 @@ import binascii
 import hashlib
 import io
 import mmap
+import os
 import struct
 import zipfile
 
@@ -36,7 +37,7 @@ from update_payload.error import PayloadError
 #
 # Helper functions.
 #
-def _ReadInt(file_obj, size, is_unsigned, hasher=None):
+def _ReadInt(file_obj, size, is_unsigned, hasher=None, name=None):
   """Reads a binary-encoded integer from a file.
 
   It will do the correct conversion based on the reported size and whether or
@@ -48,6 +49,7 @@ def _ReadInt(file_obj, size, is_unsigned, hasher=None):
     size: the integer size in bytes (2, 4 or 8)
     is_unsigned: whether it is signed or not
     hasher: an optional hasher to pass the value through
+    name: an optional file name to use in error messages
 
   Returns:
     An "unpacked" (Python) integer value.
@@ -56,7 +58,50 @@ def _ReadInt(file_obj, size, is_unsigned, hasher=None):
     PayloadError if an read error occurred.
   """
   return struct.unpack(common.IntPackingFmtStr(size, is_unsigned),
-                       common.Read(file_obj, size, hasher=hasher))[0]
+                       common.Read(file_obj, size, hasher=hasher,
+                                   name=name))[0]
+
+
+def _OpenForReading(path):
+  """Opens a file for reading, without updating its access time if possible.
+
+  Args:
+    path: the path of the file to open
+
+  Returns:
+    An unbuffered binary file object.
+  """
+  def _Opener(path, flags):
+    flags |= getattr(os, 'O_CLOEXEC', 0)
+    try:
+      return os.open(path, flags | getattr(os, 'O_NOATIME', 0))
+    except PermissionError:
+      # O_NOATIME is only allowed for the owner of the file.
+      return os.open(path, flags)
+
+  # Going through open() closes the descriptor again if it turns out not to
+  # be a readable file (e.g. a directory) and reports the path on errors.
+  return open(path, 'rb', buffering=0, opener=_Opener)
+
+
+def _MapFile(file_obj):
+  """Maps a file read-only into memory.
+
+  The returned mmap supports seek() and read() like a file object, but pages
+  are only brought in as the payload is accessed instead of being copied
+  upfront.
+
+  Args:
+    file_obj: a file object backed by a regular file
+
+  Returns:
+    An mmap object, or None if the file can't be mapped (e.g. it is empty, a
+    pipe or not backed by a file descriptor at all).
+  """
+  try:
+    return mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+  except (ValueError, OSError):
+    return None
 
 
 #
@@ -80,7 +125,7 @@ class Payload(object):
       self.metadata_signature_len = None
       self.size = None
 
-    def ReadFromPayload(self, payload_file, hasher=None):
+    def ReadFromPayload(self, payload_file, hasher=None, name=None):
       """Reads the payload header from a file.
 
       Reads the payload header from the |payload_file| and updates the |hasher|
@@ -90,6 +135,7 @@ class Payload(object):
       Args:
         payload_file: a file object
         hasher: an optional hasher to pass the value through
+        name: an optional file name to use in error messages
 
       Returns:
         None.
@@ -98,14 +144,15 @@ class Payload(object):
         PayloadError if a read error occurred or the header is invalid.
       """
       # Verify magic
-      magic = common.Read(payload_file, len(self._MAGIC), hasher=hasher)
+      magic = common.Read(payload_file, len(self._MAGIC), hasher=hasher,
+                          name=name)
       if magic != self._MAGIC:
         raise PayloadError('invalid payload magic: %s' % magic)
 
       self.version = _ReadInt(payload_file, self._VERSION_SIZE, True,
-                              hasher=hasher)
+                              hasher=hasher, name=name)
       self.manifest_len = _ReadInt(payload_file, self._MANIFEST_LEN_SIZE, True,
-                                   hasher=hasher)
+                                   hasher=hasher, name=name)
       self.size = (len(self._MAGIC) + self._VERSION_SIZE +
                    self._MANIFEST_LEN_SIZE)
       self.metadata_signature_len = 0
@@ -114,7 +161,7 @@ class Payload(object):
         self.size += self._METADATA_SIGNATURE_LEN_SIZE
         self.metadata_signature_len = _ReadInt(
             payload_file, self._METADATA_SIGNATURE_LEN_SIZE, True,
-            hasher=hasher)
+            hasher=hasher, name=name)
 
   def __init__(self, payload_file, payload_file_offset=0):
     """Initialize the payload object.
@@ -131,14 +178,19 @@ class Payload(object):
         self.payload_file = zfp.open("payload.bin", "r")
     elif isinstance(payload_file, str):
       self.name = payload_file
-      payload_fp = open(payload_file, "rb")
-      payload_bytes = mmap.mmap(
-          payload_fp.fileno(), 0, access=mmap.ACCESS_READ)
-      self.payload_file = io.BytesIO(payload_bytes)
+      with _OpenForReading(payload_file) as payload_fp:
+        self.payload_file = (_MapFile(payload_fp) or
+                             io.BytesIO(payload_fp.read()))
     else:
       self.name = payload_file.name
-      self.payload_file = payload_file
-    self.payload_file_size = self.payload_file.seek(0, io.SEEK_END)
+      self.payload_file = _MapFile(payload_file)
+      if self.payload_file is None:
+        # Streams such as pipes can't seek, so read them into memory.
+        self.payload_file = (payload_file if payload_file.seekable()
+                             else io.BytesIO(payload_file.read()))
+    # mmap.seek() doesn't return the new position, so ask for it explicitly.
+    self.payload_file.seek(0, io.SEEK_END)
+    self.payload_file_size = self.payload_file.tell()
     self.payload_file.seek(0, io.SEEK_SET)
     self.payload_file_offset = payload_file_offset
     self.manifest_hasher = None
@@ -196,7 +248,8 @@ class Payload(object):
       PayloadError if a read error occurred.
     """
     header = self._PayloadHeader()
-    header.ReadFromPayload(self.payload_file, self.manifest_hasher)
+    header.ReadFromPayload(self.payload_file, self.manifest_hasher,
+                           name=self.name)
     return header
 
   def _ReadManifest(self):
@@ -212,7 +265,7 @@ class Payload(object):
       raise PayloadError('payload header not present')
 
     return common.Read(self.payload_file, self.header.manifest_len,
-                       hasher=self.manifest_hasher)
+                       hasher=self.manifest_hasher, name=self.name)
 
   def _ReadMetadataSignature(self):
     """Reads and returns the metadata signatures.
@@ -227,10 +280,25 @@ class Payload(object):
     if not self.header:
       raise PayloadError('payload header not present')
 
-    return common.Read(
-        self.payload_file, self.header.metadata_signature_len,
-        offset=self.payload_file_offset + self.header.size +
-        self.header.manifest_len)
+    return self.ReadBlobAt(self.header.size + self.header.manifest_len,
+                           self.header.metadata_signature_len)
+
+  def ReadBlobAt(self, offset, length):
+    """Reads and returns a blob at an absolute offset in the update payload.
+
+    Args:
+      offset: offset to the beginning of the blob from the start of the payload
+      length: the blob's length
+
+    Returns:
+      A string containing the raw blob data.
+
+    Raises:
+      PayloadError if a read error occurred.
+    """
+    return common.Read(self.payload_file, length,
+                       offset=self.payload_file_offset + offset,
+                       name=self.name)
 
   def ReadDataBlob(self, offset, length):
     """Reads and returns a single data blob from the update payload.
@@ -247,7 +315,7 @@ class Payload(object):
     """
     return common.Read(self.payload_file, length,
                        offset=self.payload_file_offset + self.data_offset +
-                       offset)
+                       offset, name=self.name)
 
   def Init(self):
     """Initializes the payload object.
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Unit testing payload.py."""
+
+# Disable check for function names to avoid errors based on old code
+# pylint: disable-msg=invalid-name
+# Unit testing is all about running protected methods.
+# pylint: disable=W0212
+
+from __future__ import absolute_import
+
+import io
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import mock  # pylint: disable=import-error
+
+from update_payload import common
+from update_payload import payload
+from update_payload import test_utils
+from update_payload.error import PayloadError
+
+
+class PayloadReadTest(unittest.TestCase):
+  """Tests reading a payload file through the Payload object."""
+
+  _DATA_BLOB = b'some operation data'
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.payload_path = os.path.join(self.tmpdir, 'payload.bin')
+
+    metadata_sigs_gen = test_utils.SignaturesGenerator()
+    metadata_sigs_gen.AddSig(None, b'metadata signature')
+    self.metadata_sigs = metadata_sigs_gen.ToBinary()
+    payload_sigs_gen = test_utils.SignaturesGenerator()
+    payload_sigs_gen.AddSig(1, b'payload signature')
+    self.payload_sigs = payload_sigs_gen.ToBinary()
+
+    payload_gen = test_utils.PayloadGenerator(
+        version=common.BRILLO_MAJOR_PAYLOAD_VERSION)
+    payload_gen.SetBlockSize(test_utils.KiB(4))
+    payload_gen.AddOperation(common.ROOTFS, common.OpType.REPLACE,
+                             data_offset=0, data_length=len(self._DATA_BLOB),
+                             dst_extents=[(0, 1)])
+    payload_gen.SetSignatures(len(self._DATA_BLOB), len(self.payload_sigs))
+    manifest = payload_gen.manifest.SerializeToString()
+
+    # The test PayloadGenerator doesn't write the metadata signature length,
+    # so put the Brillo header together here.
+    header = (payload.Payload._PayloadHeader._MAGIC +
+              struct.pack('>QQI', common.BRILLO_MAJOR_PAYLOAD_VERSION,
+                          len(manifest), len(self.metadata_sigs)))
+    self.metadata_sigs_offset = len(header) + len(manifest)
+    self.payload_bytes = (header + manifest + self.metadata_sigs +
+                          self._DATA_BLOB + self.payload_sigs)
+    with open(self.payload_path, 'wb') as f:
+      f.write(self.payload_bytes)
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def _CheckPayload(self, p):
+    """Checks that the blobs of the test payload read back correctly."""
+    self.assertEqual(p.payload_file_size, len(self.payload_bytes))
+    self.assertEqual(p.ReadBlobAt(0, 4), b'CrAU')
+    self.assertEqual(p.ReadBlobAt(self.metadata_sigs_offset,
+                                  len(self.metadata_sigs)),
+                     self.metadata_sigs)
+    self.assertEqual(p._ReadMetadataSignature(), self.metadata_sigs)
+    self.assertEqual(p.ReadDataBlob(0, len(self._DATA_BLOB)), self._DATA_BLOB)
+    self.assertEqual(p.metadata_signature.SerializeToString(),
+                     self.metadata_sigs)
+    self.assertEqual(p.payload_signature.SerializeToString(),
+                     self.payload_sigs)
+
+  def testPath(self):
+    """Tests that a payload opened by path is memory-mapped."""
+    p = payload.Payload(self.payload_path)
+    self.assertIsInstance(p.payload_file, mmap.mmap)
+    self.assertEqual(p.name, self.payload_path)
+    self._CheckPayload(p)
+
+  def testUnmappablePath(self):
+    """Tests that a path that can't be mapped is read into memory instead."""
+    with mock.patch.object(payload, '_MapFile', return_value=None):
+      p = payload.Payload(self.payload_path)
+    self.assertIsInstance(p.payload_file, io.BytesIO)
+    self._CheckPayload(p)
+
+  def testFileObject(self):
+    """Tests that a payload passed as a file object is memory-mapped."""
+    with open(self.payload_path, 'rb') as f:
+      p = payload.Payload(f)
+      self.assertIsInstance(p.payload_file, mmap.mmap)
+      self.assertEqual(p.name, self.payload_path)
+      self._CheckPayload(p)
+
+  def testUnmappableFileObject(self):
+    """Tests that a file object that can't be mapped is read directly."""
+    with open(self.payload_path, 'rb') as f:
+      with mock.patch.object(payload, '_MapFile', return_value=None):
+        p = payload.Payload(f)
+      self.assertIs(p.payload_file, f)
+      self._CheckPayload(p)
+
+  def testPipe(self):
+    """Tests that a payload streamed through a pipe is read into memory."""
+    read_fd, write_fd = os.pipe()
+    with os.fdopen(write_fd, 'wb') as f:
+      f.write(self.payload_bytes)
+    with os.fdopen(read_fd, 'rb') as f:
+      p = payload.Payload(f)
+      self.assertIsInstance(p.payload_file, io.BytesIO)
+      self._CheckPayload(p)
+
+  def testPayloadFileOffset(self):
+    """Tests that ReadBlobAt() is relative to the start of the payload."""
+    prefix = b'\0' * 100
+    with open(self.payload_path, 'wb') as f:
+      f.write(prefix + self.payload_bytes)
+    p = payload.Payload(self.payload_path, payload_file_offset=len(prefix))
+    self.assertEqual(p.ReadBlobAt(0, 4), b'CrAU')
+    self.assertEqual(p._ReadMetadataSignature(), self.metadata_sigs)
+
+  def testReadBlobAtPastEnd(self):
+    """Tests that reading past the end of the payload fails."""
+    p = payload.Payload(self.payload_path)
+    with self.assertRaises(PayloadError):
+      p.ReadBlobAt(len(self.payload_bytes) - 2, 4)
+
+  def testReadOffsetPastEnd(self):
+    """Tests that reads starting past the end of the payload fail cleanly."""
+    p = payload.Payload(self.payload_path)
+    with self.assertRaisesRegex(PayloadError, self.payload_path):
+      p.ReadBlobAt(len(self.payload_bytes) + 10, 4)
+    with self.assertRaisesRegex(PayloadError, self.payload_path):
+      p.ReadDataBlob(len(self.payload_bytes), 4)
+
+  def testEmptyPath(self):
+    """Tests that an empty payload file fails with its name in the error."""
+    open(self.payload_path, 'wb').close()
+    with self.assertRaisesRegex(PayloadError, self.payload_path):
+      payload.Payload(self.payload_path)
+
+  def testEmptyFileObject(self):
+    """Tests that an empty payload file object fails to initialize."""
+    open(self.payload_path, 'wb').close()
+    with open(self.payload_path, 'rb') as f:
+      with self.assertRaisesRegex(PayloadError, self.payload_path):
+        payload.Payload(f)
+
+
+class OpenForReadingTest(unittest.TestCase):
+  """Tests opening payload files by path."""
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def testDirectory(self):
+    """Tests that opening a directory fails and names the path."""
+    with self.assertRaises(IsADirectoryError) as cm:
+      payload._OpenForReading(self.tmpdir)
+    self.assertEqual(cm.exception.filename, self.tmpdir)
+
+  def testNoAtimeNotPermitted(self):
+    """Tests that the file is still opened when O_NOATIME isn't allowed."""
+    path = os.path.join(self.tmpdir, 'payload.bin')
+    with open(path, 'wb') as f:
+      f.write(b'payload')
+
+    real_open = os.open
+    def _Open(path, flags, *args, **kwargs):
+      if flags & getattr(os, 'O_NOATIME', 0):
+        raise PermissionError('O_NOATIME not permitted')
+      return real_open(path, flags, *args, **kwargs)
+
+    with mock.patch.object(os, 'open', side_effect=_Open):
+      with payload._OpenForReading(path) as f:
+        self.assertEqual(f.read(), b'payload')
+
+
+if __name__ == '__main__':
+  unittest.main()